@@ -1,9 +1,10 @@
 from abc import abstractmethod
+from array import array
+import bisect
 import webbrowser
 import os
-import threading
+import re
 import tkinter as tk
-import time
 from tkinter.filedialog import askopenfilename, asksaveasfilename
 
 
@@ -14,10 +15,10 @@ class ParserError(Exception):
         super().__init__(message)
 
 class ParserElement:
-    def __init__(self, l: int, r: int, type: str):
+    def __init__(self, l: int, r: int, type_id: int):
         self._l = l
         self._r = r
-        self._type = type
+        self._type = type_id
 
     @property
     def l(self) -> int:
@@ -29,7 +30,7 @@ class ParserElement:
     
     @property
     def type(self) -> str:
-        return self._type
+        return TYPES[self._type]
 
 class ParserBase:
     @abstractmethod
@@ -43,7 +44,11 @@ class ParserBase:
 
     def __init__(self, text: str, whitespaces: str):
         self._text = text
-        self._whitespaces = whitespaces
+        self._text_lower = text.lower()
+        if len(self._text_lower) != len(text):
+            self._text_lower = None
+        self._whitespaces = frozenset(whitespaces)
+        self._whitespaces_re = re.compile('[' + re.escape(whitespaces) + ']+')
         self._pos = 0
         self._parse()
 
@@ -51,12 +56,13 @@ class ParserBase:
         return self._pos >= len(self._text)
 
     def _match_single(self, prefix: str, is_impotant_register = False) -> bool:
-        A = self._text[self._pos:self._pos + len(prefix)]
-        B = prefix
         if is_impotant_register:
-            return A == B
+            return self._text.startswith(prefix, self._pos)
+        elif self._text_lower is not None:
+            return self._text_lower.startswith(prefix.lower(), self._pos)
         else:
-            return A.lower() == B.lower()
+            A = self._text[self._pos:self._pos + len(prefix)]
+            return A.lower() == prefix.lower()
 
     def _match(self, prefixes: str | list[str], is_impotant_register = False) -> bool:
         if isinstance(prefixes, str):
@@ -93,7 +99,7 @@ class ParserBase:
         return None
 
     def _can_skip_whitespace(self) -> bool:
-        return (not self._is_end()) and (self._char() in self._whitespaces)
+        return self._pos < len(self._text) and self._text[self._pos] in self._whitespaces
     
     def _skip_whitespaces(self) -> None:
         if not self._can_skip_whitespace():
@@ -102,24 +108,23 @@ class ParserBase:
             self._try_skip_whitespaces()
 
     def _try_skip_whitespaces(self) -> None:
-        while self._can_skip_whitespace():
-            self._next()
-
-    def _end_filter(self, end):
-        return lambda character: not character in end
+        match = self._whitespaces_re.match(self._text, self._pos)
+        if match:
+            self._pos = match.end()
+
+    def _parse_until(self, pattern: re.Pattern, min_one = False) -> str:
+        match = pattern.match(self._text, self._pos)
+        if not match:
+            if min_one:
+                raise ParserError()
+            return ''
 
-    def _parse_text(self, text_filter, min_one = False) -> str:
-        result = ''
+        self._pos = match.end()
+        return match.group()
 
-        if min_one:
-            if self._is_end() or not text_filter(self._char()):
-                raise ParserError()
-            result += self._next()
-        
-        while not self._is_end() and text_filter(self._char()):
-            result += self._next()
-        
-        return result
+    def _skip_to(self, substring: str) -> None:
+        pos = self._text.find(substring, self._pos)
+        self._pos = pos if pos >= 0 else len(self._text)
 '''
     WHITESPACES = ' ' '\n' '\t'
     CHARW = <будь-який символ>
@@ -154,62 +159,99 @@ class ParserBase:
     text
     doctype
     script
+    style
+    comment
 '''
 
+TYPES = ('error', 'tag_name', 'tag_param_name', 'tag_param_value', 'text', 'doctype', 'script', 'style', 'comment')
+TYPE_ID = {element_type: i for i, element_type in enumerate(TYPES)}
+
+def _common_prefix_length(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a.startswith(b[lo:mid], lo):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix_length(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a.endswith(b[len(b) - mid:len(b) - lo], 0, len(a) - lo):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
 def parser_result_updater(element_type):
+    type_id = TYPE_ID[element_type]
     def _parser_element_handler(func):
         def wrapper(self, *args, **kwargs):
             pos = self._pos
             result = func(self, *args, **kwargs)
             if pos < self._pos:
-                self._result.append(ParserElement(pos, self._pos, element_type))
+                self._append_element(pos, self._pos, type_id)
             return result
         return wrapper
     return _parser_element_handler
 
 def parser_error_handler(func):
+    type_id = TYPE_ID['error']
     def wrapper(self, *args, **kwargs):
         pos = self._pos
         try:
             return func(self, *args, **kwargs)
         except ParserError as e:
-            self._result.append(ParserElement(pos, self._pos, 'error'))
+            self._append_element(pos, self._pos, type_id)
     return wrapper
 
 def parser_restorer(func):
     def wrapper(self, *args, **kwargs) -> bool:
         old_pos = self._pos
-        old_result = self._result.copy()
+        old_len = len(self._type)
         try:
             func(self, *args, **kwargs)
             return True
         except ParserError as e:
+            self._read_pos = max(self._read_pos, self._pos)
             self._pos = old_pos
-            self._result = old_result
+            del self._l[old_len:]
+            del self._r[old_len:]
+            del self._type[old_len:]
             return False
     return wrapper
 
 class HTMLParser(ParserBase):
     WHITESPACES = " \n\t"
 
+    _NAME_RE = re.compile('[^' + re.escape('!/<>"=' + WHITESPACES) + ']+')
+    _QUOTED_RE = re.compile('[^"]+')
+    _DOCTYPE_RE = re.compile('[^>]+')
+
+    # Furthest the parser peeks past its position (the '<!doctype' match).
+    _LOOKAHEAD = len('<!doctype')
+
     def __skip_name(self) -> str: 
-        return self._parse_text(text_filter = self._end_filter('!/<>"=' + HTMLParser.WHITESPACES), min_one = True)
+        return self._parse_until(HTMLParser._NAME_RE, min_one = True)
     
     def __skip_value(self) -> str:
         if self._match('"'):
             self._skip_match('"')
-            result = self._parse_text(text_filter = self._end_filter('"'))
+            result = self._parse_until(HTMLParser._QUOTED_RE)
             self._skip_match('"')
             return '"' + result + '"'
         else:
-            return self._parse_text(text_filter = self._end_filter('!/<>"=' + HTMLParser.WHITESPACES), min_one = True)
+            return self._parse_until(HTMLParser._NAME_RE, min_one = True)
     
     @parser_restorer
     @parser_result_updater('doctype')
     def __try_parse_doctype(self) -> None:
         self._skip_match('<!doctype', is_impotant_register = False)
         self._skip_whitespaces()
-        self._parse_text(text_filter = self._end_filter('>'), min_one = True)
+        self._parse_until(HTMLParser._DOCTYPE_RE, min_one = True)
         self._skip_match('>')
 
     @parser_result_updater('tag_name')
@@ -227,9 +269,10 @@ class HTMLParser(ParserBase):
     @parser_result_updater('script')
     def __parse_script(self) -> None:
         while not self._is_end():
-            self._parse_text(text_filter = self._end_filter('<'), min_one = False)
+            self._skip_to('<')
             lpos = self._pos
             if self.__try_parse_close_tag2('script'):
+                self._read_pos = max(self._read_pos, self._pos)
                 self._pos = lpos
                 break
             while not self._is_end() and self._char() == '<':
@@ -238,9 +281,10 @@ class HTMLParser(ParserBase):
     @parser_result_updater('style')
     def __parse_style(self) -> None:
         while not self._is_end():
-            self._parse_text(text_filter = self._end_filter('<'), min_one = False)
+            self._skip_to('<')
             lpos = self._pos
             if self.__try_parse_close_tag2('style'):
+                self._read_pos = max(self._read_pos, self._pos)
                 self._pos = lpos
                 break
             while not self._is_end() and self._char() == '<':
@@ -250,15 +294,16 @@ class HTMLParser(ParserBase):
     @parser_result_updater('comment')
     def __try_parse_comment(self) -> None:
         self._skip_match('<!--')
-        self._try_skip_whitespaces()
-        while not self._match('-->'):
-            self._next()
-        self._try_skip_whitespaces()
+        end = self._text.find('-->', self._pos)
+        if end < 0:
+            self._pos = len(self._text)
+            raise ParserError()
+        self._pos = end
         self._skip_match('-->')
 
     @parser_result_updater('text')
     def __try_parse_user_text(self) -> None:
-        self._parse_text(text_filter = self._end_filter('<'), min_one = False)
+        self._skip_to('<')
 
     def __try_parse_tag_param(self) -> None:
         self.__parse_tag_param_name()
@@ -329,73 +374,144 @@ class HTMLParser(ParserBase):
                     self.__parse_style()
                 self.__try_parse_close_tag(tag_name)
 
-    def __try_parse_tag_blocks(self) -> None:
+    def __try_parse_tag_blocks(self, previous: 'HTMLParser | None' = None) -> None:
         while not self._is_end() and self._char() == '<':
+            if previous is not None and self.__try_splice(previous):
+                return
+            self.__begin_block()
             self.__try_parse_comment()
             self.__parse_tag_block()
             self._try_skip_whitespaces()
             self.__try_parse_user_text()
+            self.__end_block()
 
-    def _parse(self) -> None:
-        self._result = []
+    def __parse_prologue(self) -> None:
+        self.__begin_block()
         self._try_skip_whitespaces()
 
         self.__try_parse_doctype()
         
         self._try_skip_whitespaces()
         self.__try_parse_user_text()
+        self.__end_block()
 
+    def __begin_block(self) -> None:
+        self._block_starts.append(self._pos)
+        self._block_elements.append(len(self._type))
+
+    def __end_block(self) -> None:
+        self._read_pos = max(self._read_pos, self._pos)
+        self._block_reads.append(self._read_pos + HTMLParser._LOOKAHEAD)
+
+    def __try_resume(self, previous: 'HTMLParser') -> bool:
+        if (self._text_lower is None) != (previous._text_lower is None):
+            return False
+
+        prefix = _common_prefix_length(previous._text, self._text)
+        block = bisect.bisect_right(previous._block_reads, prefix)
+        if block == 0 or block == len(previous._block_reads):
+            return False
+
+        suffix = _common_suffix_length(previous._text, self._text, min(len(previous._text), len(self._text)) - prefix)
+        self._suffix_start = len(self._text) - suffix
+        self._suffix_shift = len(self._text) - len(previous._text)
+
+        elements = previous._block_elements[block]
+        self._l = previous._l[:elements]
+        self._r = previous._r[:elements]
+        self._type = previous._type[:elements]
+        self._block_starts = previous._block_starts[:block]
+        self._block_elements = previous._block_elements[:block]
+        self._block_reads = previous._block_reads[:block]
+        self._read_pos = self._block_reads[-1] - HTMLParser._LOOKAHEAD
+        self._pos = previous._block_starts[block]
+
+        self.__try_parse_tag_blocks(previous)
+        return True
+
+    def __try_splice(self, previous: 'HTMLParser') -> bool:
+        if self._pos < self._suffix_start:
+            return False
+
+        block = bisect.bisect_left(previous._block_starts, self._pos - self._suffix_shift)
+        if block == 0 or block == len(previous._block_starts) or previous._block_starts[block] != self._pos - self._suffix_shift:
+            return False
+
+        shift = self._suffix_shift
+        elements = previous._block_elements[block]
+        element_shift = len(self._type) - elements
+        self._l.extend([l + shift for l in previous._l[elements:]])
+        self._r.extend([r + shift for r in previous._r[elements:]])
+        self._type.extend(previous._type[elements:])
+        self._block_starts.extend([start + shift for start in previous._block_starts[block:]])
+        self._block_elements.extend([index + element_shift for index in previous._block_elements[block:]])
+        last_read = self._block_reads[-1]
+        self._block_reads.extend([max(read + shift, last_read) for read in previous._block_reads[block:]])
+        return True
+
+    def _append_element(self, l: int, r: int, type_id: int) -> None:
+        self._l.append(l)
+        self._r.append(r)
+        self._type.append(type_id)
+
+    def _parse(self) -> None:
+        self._l = array('i')
+        self._r = array('i')
+        self._type = array('b')
+        self._block_starts = array('i')
+        self._block_elements = array('i')
+        self._block_reads = array('i')
+        self._read_pos = 0
+
+        previous, self._previous = self._previous, None
+        if previous is not None and self.__try_resume(previous):
+            return
+
+        self.__parse_prologue()
         self.__try_parse_tag_blocks()
 
     @property
     def result(self) -> list[ParserElement]:
-        return self._result
+        return [ParserElement(l, r, type_id) for l, r, type_id in zip(self._l, self._r, self._type)]
 
-    def __init__(self, html_text: str):
+    @property
+    def elements(self) -> tuple[array, array, array]:
+        return self._l, self._r, self._type
+
+    def elements_between(self, l: int, r: int) -> tuple[array, array, array]:
+        first = max(bisect.bisect_right(self._block_starts, l) - 1, 0)
+        last = bisect.bisect_left(self._block_starts, r)
+        begin = self._block_elements[first]
+        end = self._block_elements[last] if last < len(self._block_elements) else len(self._type)
+        return self._l[begin:end], self._r[begin:end], self._type[begin:end]
+
+    def __init__(self, html_text: str, previous: 'HTMLParser | None' = None):
+        self._previous = previous
         super().__init__(html_text, HTMLParser.WHITESPACES)
 
 class HTMLEditor:
-    class AutoParser(threading.Thread):
-        def __init__(self, html_editor):
-            threading.Thread.__init__(self)
-            self._html_editor = html_editor
-        
-        def run(self):
-            while True:
-                if self._html_editor._reset_is_modified():
-                    text = self._html_editor.get_text()
-
-                    parsed_html = HTMLParser(text)
-                    pos_converter = HTMLEditor.PositionConverter(text)
-
-                    self._html_editor._update_colors(parsed_html.result, pos_converter, text)
-                
-                time.sleep(0.2)
+    PARSE_DELAY = 150
+    LARGE_TEXT = 200_000
+    WINDOW_CONTEXT = 100
 
     class PositionConverter:
         def __init__(self, text: str):
-            self.__n_sizes = []
-            
-            last_pos = -1
-            while True:
-                try:
-                    new_pos = text.index('\n', last_pos + 1)
-                    self.__n_sizes.append(new_pos - last_pos )
-                    last_pos = new_pos
-                except:
-                    break
-            
-        def convert(self, index: int) -> float:
-            line = 1
+            self.__length = len(text)
+            self.__n_offsets = [-1]
+
+            pos = text.find('\n')
+            while pos >= 0:
+                self.__n_offsets.append(pos)
+                pos = text.find('\n', pos + 1)
             
-            for i in self.__n_sizes:
-                if i <= index:
-                    index -= i
-                    line += 1
-                else:
-                    break
+        def convert(self, index: int) -> str:
+            line = bisect.bisect_left(self.__n_offsets, index)
+            return f'{line}.{index - self.__n_offsets[line - 1] - 1}'
 
-            return f'{line}.{index}'
+        def line_start(self, line: int) -> int:
+            if line > len(self.__n_offsets):
+                return self.__length
+            return self.__n_offsets[max(line, 1) - 1] + 1
 
     def __configure_tags(self, txt_editor: tk.Text) -> None:
         txt_editor.tag_configure("default", foreground="#656D78")
@@ -411,16 +527,58 @@ class HTMLEditor:
 
     def __init__(self, txt_editor: tk.Text):
         self._txt_editor = txt_editor
-        self._temp_editor = tk.Text()
 
-        self._lock = threading.Lock()
+        self._pending_parse = None
+        self._last_text = None
+        self._last_parser = None
+        self._last_pos_converter = None
+        self._last_window = None
 
         self.__configure_tags(self._txt_editor)
-        self.__configure_tags(self._temp_editor)
 
-        self._auto_parser = HTMLEditor.AutoParser(self)
-        self._auto_parser.setDaemon(True)
-        self._auto_parser.start()
+        self._txt_editor.bind('<<Modified>>', self._on_modified)
+        self._txt_editor.configure(yscrollcommand = self._on_scroll)
+
+    def _on_modified(self, event = None) -> None:
+        if not self._txt_editor.edit_modified():
+            return
+        self._txt_editor.edit_modified(False)
+        self._last_window = None
+        self._schedule_parse()
+
+    def _on_scroll(self, first: str, last: str) -> None:
+        if self._last_text is not None and len(self._last_text) > HTMLEditor.LARGE_TEXT:
+            self._schedule_parse()
+
+    def _schedule_parse(self) -> None:
+        if self._pending_parse:
+            self._txt_editor.after_cancel(self._pending_parse)
+        self._pending_parse = self._txt_editor.after(HTMLEditor.PARSE_DELAY, self._parse)
+
+    def _parse(self) -> None:
+        self._pending_parse = None
+        text = self.get_text()
+
+        if text != self._last_text:
+            self._last_text = text
+            self._last_parser = HTMLParser(text, self._last_parser)
+            self._last_pos_converter = HTMLEditor.PositionConverter(text)
+
+        if len(text) > HTMLEditor.LARGE_TEXT:
+            l, r = self.__visible_window(self._last_pos_converter)
+            if self._last_window == (self._last_parser, l, r):
+                return
+            self._last_window = (self._last_parser, l, r)
+            self._update_window_colors(self._last_parser.elements_between(l, r), self._last_pos_converter, l, r)
+        else:
+            self._update_colors(self._last_parser.elements, self._last_pos_converter)
+
+    def __visible_window(self, pos_converter) -> tuple[int, int]:
+        top = int(self._txt_editor.index('@0,0').split('.')[0])
+        bottom = int(self._txt_editor.index(f'@0,{self._txt_editor.winfo_height()}').split('.')[0])
+        l = pos_converter.line_start(top - HTMLEditor.WINDOW_CONTEXT)
+        r = pos_converter.line_start(bottom + HTMLEditor.WINDOW_CONTEXT + 1)
+        return l, r
 
     def _remove_tags(self): 
         for tag_name in self._txt_editor.tag_names():
@@ -432,31 +590,61 @@ class HTMLEditor:
         self._txt_editor.delete(1.0, tk.END)
         self._txt_editor.insert(tk.END, text)
     
-    def _update_colors(self, info: list[ParserElement], pos_converter, text) -> None:
+    @staticmethod
+    def __index_key(index: str) -> tuple[int, int]:
+        line, column = index.split('.')
+        return int(line), int(column)
+
+    def __flatten_ranges(self, ranges: set[tuple[str, str]]) -> list[str]:
+        indices = []
+        for l, r in sorted(ranges, key = lambda tag_range: HTMLEditor.__index_key(tag_range[0])):
+            if indices and indices[-1] == l:
+                indices[-1] = r
+            else:
+                indices += [l, r]
+        return indices
+
+    def __collect_ranges(self, info: tuple[array, array, array]) -> dict[str, list[tuple[int, int]]]:
+        ranges = {}
+        for l, r, type_id in sorted(zip(*info)):
+            if l >= r:
+                continue
+            type_ranges = ranges.setdefault(TYPES[type_id], [])
+            if type_ranges and type_ranges[-1][1] >= l:
+                type_ranges[-1] = (type_ranges[-1][0], max(type_ranges[-1][1], r))
+            else:
+                type_ranges.append((l, r))
+        return ranges
+
+    def _update_window_colors(self, info: tuple[array, array, array], pos_converter, l: int, r: int) -> None:
+        first, last = pos_converter.convert(l), pos_converter.convert(r)
+        for tag_name in TYPES:
+            self._txt_editor.tag_remove(tag_name, first, last)
+
+        clipped = (
+            array('i', [max(start, l) for start in info[0]]),
+            array('i', [min(end, r) for end in info[1]]),
+            info[2],
+        )
+        for tag_name, ranges in self.__collect_ranges(clipped).items():
+            indices = [pos_converter.convert(pos) for tag_range in ranges for pos in tag_range]
+            self._txt_editor.tag_add(tag_name, *indices)
+
+    def _update_colors(self, info: tuple[array, array, array], pos_converter) -> None:
         tags = {}
 
         for tag_name in self._txt_editor.tag_names():
+            if tag_name == tk.SEL:
+                continue
             tags[tag_name] = set()
             ranges = self._txt_editor.tag_ranges(tag_name)
             for i in range(len(ranges) // 2):
                 tags[tag_name].add((str(ranges[2 * i]), str(ranges[2 * i + 1])))
 
-        _temp_editor = tk.Text()
-        self.__configure_tags(_temp_editor)
-        _temp_editor.insert(tk.END, text)
-
-        for parser_element in info:
-            l, r = [pos_converter.convert(parser_element.l), pos_converter.convert(parser_element.r)]
-
-            _temp_editor.tag_add(parser_element.type, l, r)
-
         tags_new = {}
-        
-        for tag_name in _temp_editor.tag_names():
-            tags_new[tag_name] = set()
-            ranges = _temp_editor.tag_ranges(tag_name)
-            for i in range(len(ranges) // 2):
-                tags_new[tag_name].add((str(ranges[2 * i]), str(ranges[2 * i + 1])))
+
+        for tag_name, ranges in self.__collect_ranges(info).items():
+            tags_new[tag_name] = set((pos_converter.convert(l), pos_converter.convert(r)) for l, r in ranges)
         
         keys = set([*tags.keys(), *tags_new.keys()])
         tags_to_remove = {}
@@ -472,12 +660,12 @@ class HTMLEditor:
                 tags_to_remove[key] = tags[key].difference(tags_new[key]) 
         
         for k, v in tags_to_remove.items():
-            for r in v:
-                self._txt_editor.tag_remove(k, r[0], r[1])
+            if v:
+                self._txt_editor.tag_remove(k, *self.__flatten_ranges(v))
         
         for k, v in tags_to_add.items():
-            for r in v:
-                self._txt_editor.tag_add(k, r[0], r[1])
+            if v:
+                self._txt_editor.tag_add(k, *self.__flatten_ranges(v))
 
     def get_text(self) -> str:
         return self._txt_editor.get(1.0, tk.END)
@@ -485,12 +673,6 @@ class HTMLEditor:
     def insert(self, text) -> None:
         self._txt_editor.insert(tk.INSERT, text)
 
-    def _reset_is_modified(self) -> bool:
-        with self._lock:
-            result = self._txt_editor.edit_modified()
-            self._txt_editor.edit_modified(False)
-            return result
-
 class Application:
     def _open_file(self):
         filepath = askopenfilename(